@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for the webhook server.
+
+Usage: gunicorn -c gunicorn_conf.py webhook_server:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+# gevent greenlets yield while waiting on HubSpot, so one worker can hold
+# many webhook requests and background syncs at once
+worker_class = "gevent"
+worker_connections = 1000
+
+# A single worker on purpose; WEB_CONCURRENCY is ignored since some hosts
+# set it automatically. Sync state is per process and only correct when
+# every request shares it:
+# - the SQLite sync queue has one owner, which resumes its rows at startup
+# - the last-sync snapshots decide which events are skipped
+# - queued-ID dedup, the per-portal rate controllers and /health counters
+# gevent supplies the concurrency instead. Syncs still queued survive a
+# worker restart only while SYNC_QUEUE_PATH does (see webhook_server.py).
+workers = 1
@@ -7,19 +7,60 @@ Automatically syncs contacts to a partner HubSpot portal when:
 - A contact is created
 - A contact is updated
 
+Runs under gunicorn's gevent worker: HubSpot calls are ordinary blocking
+requests that yield to other greenlets, so webhook handling and the
+background sync pool scale without an async rewrite.
+
+Webhooks are acknowledged with 202 once their contacts are written to a
+local SQLite queue (SYNC_QUEUE_PATH); rows are deleted when their sync
+finishes and left-over rows are resubmitted at startup, so a crash or
+restart does not drop accepted events. The queue only survives as long as
+its file does: on hosts with an ephemeral filesystem (e.g. a Heroku dyno
+restart or deploy) point SYNC_QUEUE_PATH at persistent storage, or accept
+that syncs still queued at that moment are lost.
+
 Environment Variables Required:
     HUBSPOT_SOURCE_TOKEN    - Your HubSpot private app token
     HUBSPOT_DEST_TOKEN      - Partner's HubSpot access token
+
+Optional:
+    HUBSPOT_CLIENT_SECRET   - App client secret; enables webhook signature checks
+    SYNC_WORKERS            - Concurrent background syncs (default 16)
+    SYNC_QUEUE_PATH         - SQLite file holding accepted syncs (default sync_queue.db)
+    USE_DEV_SERVER          - Run Flask's dev server instead of gunicorn
 """
 
 import os
-import json
+
+# Patch sockets before requests/urllib3 are imported so HubSpot calls yield
+# to other greenlets under the gunicorn gevent worker. The dev server runs
+# unpatched.
+if not os.environ.get("USE_DEV_SERVER"):
+    from gevent import monkey
+    monkey.patch_all()
+
+import base64
+import hmac
 import logging
+import random
+import socket
+import sqlite3
+import threading
 import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache, wraps
 
+import orjson
 import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # =============================================================================
 # CONFIGURATION
@@ -31,10 +72,23 @@ class Config:
     # HubSpot tokens
     SOURCE_TOKEN = os.environ.get("HUBSPOT_SOURCE_TOKEN", "")
     DEST_TOKEN = os.environ.get("HUBSPOT_DEST_TOKEN", "")
+    CLIENT_SECRET = os.environ.get("HUBSPOT_CLIENT_SECRET", "")
+    
+    # Reject webhooks older than this (HubSpot recommends 5 minutes)
+    MAX_WEBHOOK_AGE_MS = 5 * 60 * 1000
     
     # Server settings
     PORT = int(os.environ.get("PORT", 8080))
     
+    # Concurrency settings
+    SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", 16))
+    SYNC_QUEUE_PATH = os.environ.get("SYNC_QUEUE_PATH", "sync_queue.db")
+    
+    # HubSpot request timing: fail fast on connect, allow slower reads, and
+    # stop starting retries once a call has run this many seconds
+    REQUEST_TIMEOUT = (3.05, 27)
+    REQUEST_DEADLINE = 60
+    
     # Minimal safe properties that should exist in any HubSpot portal
     SAFE_PROPERTIES = ["email", "firstname", "lastname", "phone", "address", "city", "state", "zip"]
     
@@ -54,6 +108,13 @@ class Config:
         # Opt-out
         "opted_out_of_communications_afm"
     ]
+    
+    # Set views for O(1) membership checks when filtering contact properties
+    SAFE_PROPERTIES_SET = frozenset(SAFE_PROPERTIES)
+    ALL_PROPERTIES_SET = frozenset(ALL_PROPERTIES)
+    
+    # Query string for reading ALL_PROPERTIES, built once at import
+    PROPERTIES_QS = "properties=" + ",".join(ALL_PROPERTIES)
 
 
 # =============================================================================
@@ -72,91 +133,471 @@ logger = logging.getLogger(__name__)
 # FLASK APP
 # =============================================================================
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify."""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round-trip of the default provider
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# TLS terminates at the platform router; trust its X-Forwarded-Proto/Host so
+# request.url matches the https URL HubSpot signs
+app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 
 # =============================================================================
 # HUBSPOT API CLIENT
 # =============================================================================
 
+# Pooled sessions keyed by access token, so keep-alive connections to
+# api.hubapi.com are reused across webhook calls instead of re-doing TLS
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# Monotonic deadline of the HubSpot call in progress on this thread/greenlet,
+# set by HubSpotAPI._request and honoured by JitteredRetry
+_CALL_DEADLINE = threading.local()
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with full-jitter backoff and Retry-After as a floor.
+    
+    Plain Retry sleeps exactly Retry-After on a 429, so workers throttled
+    together all retry at the same instant. Here each wait is a random
+    point in the capped exponential window, never shorter than Retry-After.
+    Waits are clipped to the current call's deadline, and no retry starts
+    once it has passed.
+    """
+    
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, super().get_backoff_time())
+    
+    def is_exhausted(self) -> bool:
+        deadline = getattr(_CALL_DEADLINE, "value", None)
+        if deadline is not None and time.monotonic() >= deadline:
+            return True
+        return super().is_exhausted()
+    
+    def sleep(self, response=None) -> None:
+        retry_after = None
+        if response is not None and self.respect_retry_after_header:
+            retry_after = self.get_retry_after(response)
+        delay = max(retry_after or 0, self.get_backoff_time())
+        deadline = getattr(_CALL_DEADLINE, "value", None)
+        if deadline is not None:
+            delay = min(delay, max(0, deadline - time.monotonic()))
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Rate limits and transient errors are retried by urllib3 with jittered
+# exponential backoff (capped at 30s). Network failures and error statuses
+# have separate budgets, so a run of 429s does not use up the attempts
+# reserved for connection errors. The final response is returned rather
+# than raised so callers see the real status code.
+_RETRY = JitteredRetry(
+    total=None,
+    connect=5,
+    read=5,
+    status=8,
+    other=0,
+    backoff_factor=0.5,
+    backoff_max=30,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST", "PATCH"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+
+# TCP keepalive probes keep idle pooled sockets from being silently dropped
+# by NATs/load balancers between webhook bursts
+_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    _SOCKET_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+    ]
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections use _SOCKET_OPTIONS."""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = _SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _make_session(access_token: str) -> requests.Session:
+    """Build a keep-alive session with auth headers for one token."""
+    session = requests.Session()
+    session.headers.update({
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    })
+    # One pooled connection per sync worker; pool_block makes extra callers
+    # wait for a free keep-alive socket instead of opening a throwaway one
+    session.mount("https://", KeepAliveAdapter(
+        pool_connections=4,
+        pool_maxsize=Config.SYNC_WORKERS,
+        pool_block=True,
+        max_retries=_RETRY
+    ))
+    return session
+
+
+def _get_session(access_token: str) -> requests.Session:
+    """Return the shared session for a token, creating it on first use."""
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(access_token)
+        if session is None:
+            session = _SESSIONS[access_token] = _make_session(access_token)
+        return session
+
+
+class RateController:
+    """AIMD cap on in-flight requests, driven by HubSpot's rate-limit headers.
+    
+    A 429, or a response showing at most LOW_WATER of the window's quota
+    left, multiplies the cap by BETA; any other response adds ALPHA, up to
+    max_limit. Requests throttle before HubSpot starts rejecting them.
+    """
+    
+    ALPHA = 0.5
+    BETA = 0.5
+    LOW_WATER = 0.1
+    
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+    
+    def acquire(self):
+        """Block until the current cap allows another request."""
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+    
+    def release(self):
+        """Mark a request as finished."""
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+    
+    def on_response(self, response: requests.Response):
+        """Adjust the cap from a response's status and rate-limit headers."""
+        try:
+            remaining = int(response.headers["X-HubSpot-RateLimit-Remaining"])
+            ratio = remaining / int(response.headers["X-HubSpot-RateLimit-Max"])
+        except (KeyError, ValueError, ZeroDivisionError):
+            ratio = None
+        
+        with self.cond:
+            if response.status_code == 429 or (ratio is not None and ratio <= self.LOW_WATER):
+                self.limit = max(self.min_limit, self.limit * self.BETA)
+            else:
+                self.limit = min(self.max_limit, self.limit + self.ALPHA)
+                self.cond.notify_all()
+
+
 class HubSpotAPI:
     """Simple HubSpot API client."""
     
     BASE_URL = "https://api.hubapi.com"
+    # Default get_contact path, with the properties query baked in at import
+    CONTACT_PATH_TMPL = "/crm/v3/objects/contacts/{id}?" + Config.PROPERTIES_QS
+    BATCH_LIMIT = 100  # Max inputs per batch endpoint call
     
     def __init__(self, access_token: str):
         self.token = access_token
-        self.headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
+        # Rate limits are per portal, so each token gets its own controller
+        self.rate_controller = RateController(Config.SYNC_WORKERS)
+    
+    @property
+    def session(self) -> requests.Session:
+        """Pooled session for this token, built on first use (after any fork)."""
+        return _get_session(self.token)
     
     def _request(self, method: str, endpoint: str, data: dict = None) -> tuple:
         """Make API request. Returns (success, response_or_error)."""
         url = f"{self.BASE_URL}{endpoint}"
         
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=self.headers,
-                json=data,
-                timeout=30
-            )
-            
-            # Handle rate limiting
-            if response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", 10))
-                logger.warning(f"Rate limited, waiting {retry_after}s...")
-                time.sleep(retry_after)
-                return self._request(method, endpoint, data)
+            self.rate_controller.acquire()
+            _CALL_DEADLINE.value = time.monotonic() + Config.REQUEST_DEADLINE
+            try:
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    data=orjson.dumps(data) if data is not None else None,
+                    timeout=Config.REQUEST_TIMEOUT
+                )
+            finally:
+                _CALL_DEADLINE.value = None
+                self.rate_controller.release()
+            self.rate_controller.on_response(response)
             
             if response.status_code >= 400:
                 error_msg = response.text[:500]
                 return False, f"{response.status_code}: {error_msg}"
             
-            return True, response.json() if response.text else {}
+            # Parse the raw bytes; skips decoding the body to str first
+            return True, orjson.loads(response.content) if response.content else {}
             
         except Exception as e:
             return False, str(e)
     
-    def get_contact(self, contact_id: str, properties: list) -> tuple:
-        """Get contact by ID."""
+    def get_contact(self, contact_id: str, properties: list = None) -> tuple:
+        """Get contact by ID, reading Config.ALL_PROPERTIES unless given a list."""
+        if not properties:
+            return self._request("GET", self.CONTACT_PATH_TMPL.format(id=contact_id))
         props = ",".join(properties)
         return self._request("GET", f"/crm/v3/objects/contacts/{contact_id}?properties={props}")
     
-    def search_by_email(self, email: str) -> tuple:
-        """Find contact by email."""
+    def upsert_contact(self, email: str, properties: dict) -> tuple:
+        """Create or update the contact with this email in a single call.
+        
+        Returns (success, contact_or_error); the contact carries "new" when
+        it was created, matching batch_upsert results.
+        """
+        success, result = self.batch_upsert([{**properties, "email": email}])
+        if not success:
+            return False, result
+        if not result:
+            return False, "No upsert result returned"
+        return True, result[0]
+    
+    def batch_read(self, contact_ids: list, properties: list) -> tuple:
+        """Get up to BATCH_LIMIT contacts by ID. Returns (success, contacts_or_error)."""
         data = {
-            "filterGroups": [{
-                "filters": [{
-                    "propertyName": "email",
-                    "operator": "EQ",
-                    "value": email
-                }]
-            }]
+            "inputs": [{"id": contact_id} for contact_id in contact_ids],
+            "properties": properties
         }
-        success, result = self._request("POST", "/crm/v3/objects/contacts/search", data)
+        success, result = self._request("POST", "/crm/v3/objects/contacts/batch/read", data)
         if success:
-            results = result.get("results", [])
-            return True, results[0] if results else None
+            return True, result.get("results", [])
         return False, result
     
-    def create_contact(self, properties: dict) -> tuple:
-        """Create a new contact."""
-        return self._request("POST", "/crm/v3/objects/contacts", {"properties": properties})
+    def batch_upsert(self, records: list) -> tuple:
+        """Create or update up to BATCH_LIMIT contacts, matched on email.
+        
+        Each record is a properties dict containing "email". Returns
+        (success, results_or_error); each result carries "new" when created.
+        """
+        data = {
+            "inputs": [
+                {"idProperty": "email", "id": properties["email"], "properties": properties}
+                for properties in records
+            ]
+        }
+        success, result = self._request("POST", "/crm/v3/objects/contacts/batch/upsert", data)
+        if success:
+            return True, result.get("results", [])
+        return False, result
+
+
+@lru_cache(maxsize=4)
+def get_api(access_token: str) -> HubSpotAPI:
+    """Return the shared client for a token, so its rate controller is per
+    portal rather than per caller."""
+    return HubSpotAPI(access_token)
+
+
+SOURCE_API = get_api(Config.SOURCE_TOKEN)
+DEST_API = get_api(Config.DEST_TOKEN)
+
+
+# =============================================================================
+# WEBHOOK VERIFICATION
+# =============================================================================
+
+# Encoded once rather than on every webhook
+_CLIENT_SECRET_BYTES = Config.CLIENT_SECRET.encode()
+
+# Recently accepted signatures, to reject exact replays inside the
+# freshness window
+_RECENT_SIGNATURES = deque(maxlen=1000)
+_RECENT_SIGNATURES_LOCK = threading.Lock()
+
+
+def verify_hubspot_signature(f):
+    """Decorator to verify HubSpot v3 webhook signatures."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        # Skip verification if no client secret configured (for testing)
+        if not Config.CLIENT_SECRET:
+            logger.debug("No CLIENT_SECRET set - skipping signature verification")
+            return f(*args, **kwargs)
+        
+        signature = request.headers.get("X-HubSpot-Signature-v3")
+        timestamp = request.headers.get("X-HubSpot-Request-Timestamp")
+        
+        if not signature or not timestamp:
+            logger.warning("Missing webhook signature headers")
+            return jsonify({"error": "Missing signature"}), 401
+        
+        # Reject stale or replayed requests before hashing the body
+        try:
+            age_ms = abs(time.time() * 1000 - int(timestamp))
+        except ValueError:
+            age_ms = None
+        if age_ms is None or age_ms > Config.MAX_WEBHOOK_AGE_MS:
+            logger.warning("Stale webhook timestamp")
+            return jsonify({"error": "Stale request"}), 401
+        
+        with _RECENT_SIGNATURES_LOCK:
+            replayed = signature in _RECENT_SIGNATURES
+        if replayed:
+            logger.warning("Replayed webhook signature")
+            return jsonify({"error": "Replayed request"}), 401
+        
+        # HMAC-SHA256 of method + uri + body + timestamp, base64 encoded. The
+        # raw body is cached for the handler and fed in without copying.
+        mac = hmac.new(_CLIENT_SECRET_BYTES, None, "sha256")
+        mac.update(request.method.encode())
+        mac.update(request.url.encode())
+        mac.update(request.get_data(cache=True))
+        mac.update(timestamp.encode())
+        expected_signature = base64.b64encode(mac.digest())
+        
+        if not hmac.compare_digest(expected_signature, signature.encode()):
+            logger.warning("Invalid webhook signature")
+            return jsonify({"error": "Invalid signature"}), 401
+        
+        with _RECENT_SIGNATURES_LOCK:
+            _RECENT_SIGNATURES.append(signature)
+        
+        return f(*args, **kwargs)
     
-    def update_contact(self, contact_id: str, properties: dict) -> tuple:
-        """Update existing contact."""
-        return self._request("PATCH", f"/crm/v3/objects/contacts/{contact_id}", {"properties": properties})
+    return decorated
 
 
 # =============================================================================
 # SYNC LOGIC
 # =============================================================================
 
-def sync_contact_to_partner(contact_id: str, event_type: str = "unknown") -> dict:
-    """Sync a single contact to the partner portal."""
+# Webhook subscription types that trigger a contact sync
+_SYNCED_EVENTS = frozenset({"contact.creation", "contact.propertyChange"})
+
+# Background workers for webhook syncs. The webhook handler only enqueues
+# work here so HubSpot gets its 2xx without waiting on API round-trips.
+SYNC_POOL = ThreadPoolExecutor(max_workers=Config.SYNC_WORKERS)
+
+# Background sync outcomes since this process started ("queued" plus one
+# key per result status), reported by /health since webhook responses no
+# longer carry them. Counts are per process; /health tags them with its pid.
+SYNC_STATS = Counter()
+_SYNC_STATS_LOCK = threading.Lock()
+
+class SyncQueue:
+    """Durable record of accepted syncs in a local SQLite file (WAL mode).
+    
+    The webhook stores its contacts here before acknowledging, and each row
+    is deleted once its batch finishes, so rows left at startup are syncs a
+    crash or restart interrupted. Only one process may use a file.
+    """
+    
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL commits survive a process crash; only power loss can
+        # drop the last transactions
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_queue ("
+            "id INTEGER PRIMARY KEY, contact_id TEXT NOT NULL, event_type TEXT NOT NULL)"
+        )
+    
+    def add(self, items) -> list:
+        """Store (contact_id, event_type) pairs. Returns (row_id, contact_id, event_type) rows."""
+        rows = []
+        with self.lock, self.conn:
+            for contact_id, event_type in items:
+                cursor = self.conn.execute(
+                    "INSERT INTO sync_queue (contact_id, event_type) VALUES (?, ?)",
+                    (contact_id, event_type)
+                )
+                rows.append((cursor.lastrowid, contact_id, event_type))
+        return rows
+    
+    def remove(self, row_ids):
+        """Delete finished rows."""
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM sync_queue WHERE id = ?", [(row_id,) for row_id in row_ids])
+    
+    def pending(self) -> list:
+        """Return every stored (row_id, contact_id, event_type) row, oldest first."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, contact_id, event_type FROM sync_queue ORDER BY id"
+            ).fetchall()
+
+
+SYNC_QUEUE = SyncQueue(Config.SYNC_QUEUE_PATH)
+
+# Contact IDs queued for sync whose source data has not been read yet.
+# Further events for these are dropped since the queued sync will pick up
+# the latest values anyway.
+_QUEUED_IDS = set()
+_QUEUED_IDS_LOCK = threading.Lock()
+
+# Properties last synced in full per source contact ID, so repeat events
+# with nothing new are skipped. Only the skip decision reads this; any
+# change sends the full property set, since the upsert is keyed on email
+# and may land on a new or different partner record. Skipping is only safe
+# because gunicorn_conf.py runs a single worker; a second process would
+# skip from its own stale snapshot.
+_LAST_SYNC = TTLCache(maxsize=50_000, ttl=3600)
+_LAST_SYNC_LOCK = threading.Lock()
+
+
+def unchanged_since_sync(contact_id: str, props: dict) -> bool:
+    """Return True if the contact was last fully synced with exactly these properties."""
+    with _LAST_SYNC_LOCK:
+        return _LAST_SYNC.get(contact_id) == props
+
+
+def remember_synced(contact_id: str, props: dict):
+    """Record the properties a contact was fully synced with."""
+    with _LAST_SYNC_LOCK:
+        _LAST_SYNC[contact_id] = props
+
+
+def split_properties(props: dict) -> tuple:
+    """Filter source properties in one pass. Returns (full_props, safe_props)."""
+    full_props, safe_props = {}, {}
+    all_set, safe_set = Config.ALL_PROPERTIES_SET, Config.SAFE_PROPERTIES_SET
+    for k, v in props.items():
+        if not v:
+            continue
+        if k in all_set:
+            full_props[k] = v
+        if k in safe_set:
+            safe_props[k] = v
+    return full_props, safe_props
+
+
+def sync_contact_to_partner(contact_id: str, event_type: str = "unknown", force: bool = False) -> dict:
+    """Sync a single contact to the partner portal.
+    
+    force pushes the contact even if it is unchanged since its last sync.
+    """
     
     result = {
         "contact_id": contact_id,
@@ -167,13 +608,12 @@ def sync_contact_to_partner(contact_id: str, event_type: str = "unknown") -> dic
     
     try:
         # Get contact from source
-        source = HubSpotAPI(Config.SOURCE_TOKEN)
-        success, contact = source.get_contact(contact_id, Config.ALL_PROPERTIES)
+        success, contact = SOURCE_API.get_contact(contact_id)
         
         if not success:
             result["status"] = "error"
             result["message"] = f"Failed to get contact from source: {contact}"
-            logger.error(f"[{event_type}] {result['message']}")
+            logger.error("[%s] %s", event_type, result["message"])
             return result
         
         props = contact.get("properties", {})
@@ -182,129 +622,348 @@ def sync_contact_to_partner(contact_id: str, event_type: str = "unknown") -> dic
         if not email:
             result["status"] = "skipped"
             result["message"] = "Contact has no email"
-            logger.info(f"[{event_type}] Skipped contact {contact_id} - no email")
+            logger.info("[%s] Skipped contact %s - no email", event_type, contact_id)
             return result
         
-        # Check if contact exists in destination
-        dest = HubSpotAPI(Config.DEST_TOKEN)
-        success, existing = dest.search_by_email(email)
+        # Try full properties first, upserting on email in the destination
+        full_props, safe_props = split_properties(props)
         
-        if not success:
-            result["status"] = "error"
-            result["message"] = f"Failed to search destination: {existing}"
-            logger.error(f"[{event_type}] {result['message']}")
+        if not force and unchanged_since_sync(contact_id, full_props):
+            result["status"] = "skipped"
+            result["message"] = "No changes since last sync"
+            logger.info("[%s] Skipped contact %s - unchanged", event_type, contact_id)
             return result
         
-        # Try full properties first
-        full_props = {k: v for k, v in props.items() if k in Config.ALL_PROPERTIES and v}
-        logger.info(f"Attempting sync with properties: {list(full_props.keys())}")
+        logger.info("Attempting sync with properties: %s", list(full_props.keys()))
         
-        if existing:
-            success, response = dest.update_contact(existing["id"], full_props)
-        else:
-            success, response = dest.create_contact(full_props)
+        success, response = DEST_API.upsert_contact(email, full_props)
         
         if success:
-            action = "Updated" if existing else "Created"
-            result["status"] = "updated" if existing else "created"
+            remember_synced(contact_id, full_props)
+            action = "Created" if response.get("new") else "Updated"
+            result["status"] = action.lower()
             result["message"] = f"{action} contact: {email}"
-            logger.info(f"[{event_type}] {result['message']}")
+            logger.info("[%s] %s", event_type, result["message"])
             return result
         
         # If full properties failed, try with safe/minimal properties
-        logger.warning(f"Full sync failed: {response}")
+        logger.warning("Full sync failed: %s", response)
         logger.info("Retrying with minimal properties...")
         
-        safe_props = {k: v for k, v in props.items() if k in Config.SAFE_PROPERTIES and v}
-        logger.info(f"Using minimal properties: {list(safe_props.keys())}")
+        logger.info("Using minimal properties: %s", list(safe_props.keys()))
         
-        if existing:
-            success, response = dest.update_contact(existing["id"], safe_props)
-        else:
-            success, response = dest.create_contact(safe_props)
+        success, response = DEST_API.upsert_contact(email, safe_props)
         
         if success:
-            action = "Updated" if existing else "Created"
-            result["status"] = "updated" if existing else "created"
+            action = "Created" if response.get("new") else "Updated"
+            result["status"] = action.lower()
             result["message"] = f"{action} contact (minimal): {email}"
-            logger.info(f"[{event_type}] {result['message']}")
+            logger.info("[%s] %s", event_type, result["message"])
         else:
             result["status"] = "error"
             result["message"] = f"Failed even with minimal properties: {response}"
-            logger.error(f"[{event_type}] {result['message']}")
+            logger.error("[%s] %s", event_type, result["message"])
         
         return result
         
     except Exception as e:
         result["status"] = "error"
         result["message"] = str(e)
-        logger.error(f"[{event_type}] Exception syncing contact {contact_id}: {e}")
+        logger.error("[%s] Exception syncing contact %s: %s", event_type, contact_id, e)
         return result
 
 
+def sync_contacts_batch(contact_ids: list, event_types: list) -> list:
+    """Sync up to BATCH_LIMIT contacts with one batch read and one batch upsert.
+    
+    A rejected upsert is split up so only the contacts HubSpot refuses fall
+    back to minimal properties.
+    """
+    
+    results = {}
+    for contact_id, event_type in zip(contact_ids, event_types):
+        results[contact_id] = {
+            "contact_id": contact_id,
+            "event_type": event_type,
+            "status": "unknown",
+            "message": ""
+        }
+    
+    # From here on, new events for these contacts need a fresh sync
+    with _QUEUED_IDS_LOCK:
+        _QUEUED_IDS.difference_update(results)
+    
+    try:
+        # Get all contacts from source in one call
+        success, contacts = SOURCE_API.batch_read(list(results), Config.ALL_PROPERTIES)
+        
+        if not success:
+            for result in results.values():
+                result["status"] = "error"
+                result["message"] = f"Failed to get contacts from source: {contacts}"
+            logger.error("Batch read failed for %s contact(s): %s", len(results), contacts)
+            return _finish_batch(results)
+        
+        # Group by email; the destination upsert is keyed on it
+        props_by_email = {}
+        ids_by_email = {}
+        for contact in contacts:
+            contact_id = str(contact.get("id", ""))
+            props = contact.get("properties", {})
+            email = props.get("email")
+            
+            if contact_id not in results:
+                continue
+            
+            if not email:
+                results[contact_id]["status"] = "skipped"
+                results[contact_id]["message"] = "Contact has no email"
+                logger.info("[%s] Skipped contact %s - no email", results[contact_id]["event_type"], contact_id)
+                continue
+            
+            props_by_email[email.lower()] = props
+            ids_by_email.setdefault(email.lower(), []).append(contact_id)
+        
+        if not props_by_email:
+            return _finish_batch(results)
+        
+        # Try full properties for changed contacts first, then safe/minimal properties
+        full_records, safe_by_email = [], {}
+        synced_props = {}
+        for email, props in props_by_email.items():
+            # props came from the last contact grouped under this email
+            contact_id = ids_by_email[email][-1]
+            full_props, safe_props = split_properties(props)
+            
+            if unchanged_since_sync(contact_id, full_props):
+                for skipped_id in ids_by_email.pop(email):
+                    results[skipped_id]["status"] = "skipped"
+                    results[skipped_id]["message"] = "No changes since last sync"
+                continue
+            
+            full_records.append(full_props)
+            safe_by_email[email] = safe_props
+            synced_props[email] = (contact_id, full_props)
+        
+        if not full_records:
+            return _finish_batch(results)
+        
+        upserted, failed = upsert_isolating_failures(full_records)
+        _record_upserts(upserted, ids_by_email, results)
+        
+        # A partial response leaves some inputs out of the results; only
+        # the contacts HubSpot returned count as synced
+        for contact in upserted:
+            email = (contact.get("properties", {}).get("email") or "").lower()
+            if email in synced_props:
+                remember_synced(*synced_props[email])
+        
+        if failed:
+            logger.warning("Full sync failed for %s contact(s): %s", len(failed), failed[0][1])
+            logger.info("Retrying those with minimal properties...")
+            upserted, failed = upsert_isolating_failures(
+                [safe_by_email[record["email"].lower()] for record, _ in failed]
+            )
+            _record_upserts(upserted, ids_by_email, results, minimal=True)
+        
+        if failed:
+            for record, error in failed:
+                for contact_id in ids_by_email.get(record["email"].lower(), []):
+                    results[contact_id]["status"] = "error"
+                    results[contact_id]["message"] = f"Failed even with minimal properties: {error}"
+            logger.error("Upsert failed for %s contact(s): %s", len(failed), failed[0][1])
+        
+    except Exception as e:
+        for result in results.values():
+            if result["status"] == "unknown":
+                result["status"] = "error"
+                result["message"] = str(e)
+        logger.error("Exception syncing batch of %s contact(s): %s", len(results), e)
+    
+    return _finish_batch(results)
+
+
+def _is_client_error(error) -> bool:
+    """True for a "4xx: ..." error from HubSpotAPI._request, other than 429."""
+    status = str(error).split(":", 1)[0]
+    return status.isdigit() and 400 <= int(status) < 500 and status != "429"
+
+
+def upsert_isolating_failures(records: list) -> tuple:
+    """Batch upsert records, halving a batch HubSpot rejects with a 4xx so a
+    bad record only fails itself and its neighbours keep their properties.
+    
+    Returns (upserted, failed); failed holds (record, error) pairs.
+    """
+    success, response = DEST_API.batch_upsert(records)
+    if success:
+        return response, []
+    if len(records) == 1 or not _is_client_error(response):
+        return [], [(record, response) for record in records]
+    
+    mid = len(records) // 2
+    left_ok, left_failed = upsert_isolating_failures(records[:mid])
+    right_ok, right_failed = upsert_isolating_failures(records[mid:])
+    return left_ok + right_ok, left_failed + right_failed
+
+
+def _record_upserts(upserted: list, ids_by_email: dict, results: dict, minimal: bool = False):
+    """Mark the contacts behind each upsert result as created or updated."""
+    for contact in upserted:
+        email = contact.get("properties", {}).get("email") or ""
+        action = "Created" if contact.get("new") else "Updated"
+        for contact_id in ids_by_email.get(email.lower(), []):
+            result = results[contact_id]
+            result["status"] = action.lower()
+            result["message"] = f"{action} contact{' (minimal)' if minimal else ''}: {email}"
+            logger.info("[%s] %s", result["event_type"], result["message"])
+
+
+def submit_queued(rows: list):
+    """Submit stored (row_id, contact_id, event_type) rows to SYNC_POOL in batches."""
+    batch_size = HubSpotAPI.BATCH_LIMIT
+    for start in range(0, len(rows), batch_size):
+        SYNC_POOL.submit(_run_queued_batch, rows[start:start + batch_size])
+
+
+def _run_queued_batch(rows: list) -> list:
+    """Sync one batch of queued rows, then drop them from SYNC_QUEUE."""
+    row_ids, contact_ids, event_types = zip(*rows)
+    try:
+        return sync_contacts_batch(list(contact_ids), list(event_types))
+    finally:
+        SYNC_QUEUE.remove(row_ids)
+
+
+def resume_queued_syncs():
+    """Resubmit syncs a previous process accepted but did not finish."""
+    rows = SYNC_QUEUE.pending()
+    if not rows:
+        return
+    with _QUEUED_IDS_LOCK:
+        _QUEUED_IDS.update(contact_id for _, contact_id, _ in rows)
+    submit_queued(rows)
+    logger.info("Resumed %s queued sync(s) from %s", len(rows), Config.SYNC_QUEUE_PATH)
+
+
+def _finish_batch(results: dict) -> list:
+    """Mark contacts the batch calls did not account for as errors and
+    record the batch's outcomes in SYNC_STATS."""
+    for result in results.values():
+        if result["status"] == "unknown":
+            result["status"] = "error"
+            result["message"] = "No result returned for contact"
+            logger.error("[%s] No batch result for contact %s", result["event_type"], result["contact_id"])
+    with _SYNC_STATS_LOCK:
+        SYNC_STATS.update(result["status"] for result in results.values())
+    return list(results.values())
+
+
+resume_queued_syncs()
+
+
 # =============================================================================
 # ROUTES
 # =============================================================================
 
+# Config is fixed at startup, so the info page body is serialized once
+_INDEX_BODY = orjson.dumps({
+    "service": "HubSpot Webhook Sync",
+    "status": "running",
+    "endpoints": {
+        "webhooks": "/webhooks/hubspot",
+        "health": "/health",
+        "test_sync": "/test/sync/<contact_id>"
+    },
+    "config": {
+        "source_token_set": bool(Config.SOURCE_TOKEN),
+        "dest_token_set": bool(Config.DEST_TOKEN),
+        "client_secret_set": bool(Config.CLIENT_SECRET),
+        "properties": Config.ALL_PROPERTIES,
+        "safe_properties": Config.SAFE_PROPERTIES
+    }
+})
+
+
 @app.route("/")
 def index():
     """Health check and info page."""
-    return jsonify({
-        "service": "HubSpot Webhook Sync",
-        "status": "running",
-        "endpoints": {
-            "webhooks": "/webhooks/hubspot",
-            "health": "/health",
-            "test_sync": "/test/sync/<contact_id>"
-        },
-        "config": {
-            "source_token_set": bool(Config.SOURCE_TOKEN),
-            "dest_token_set": bool(Config.DEST_TOKEN),
-            "properties": Config.ALL_PROPERTIES,
-            "safe_properties": Config.SAFE_PROPERTIES
-        }
-    })
+    return app.response_class(_INDEX_BODY, mimetype="application/json")
 
 
 @app.route("/health")
 def health():
-    """Health check endpoint."""
-    return jsonify({"status": "healthy", "timestamp": datetime.utcnow().isoformat()})
+    """Health check endpoint, with this worker's background sync counters.
+    
+    "pid" identifies the worker the counters belong to; gunicorn_conf.py
+    runs one worker, so normally they cover every sync.
+    """
+    with _SYNC_STATS_LOCK:
+        stats = dict(SYNC_STATS)
+    body = orjson.dumps({
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "pid": os.getpid(),
+        "sync": stats
+    })
+    return app.response_class(body, mimetype="application/json")
 
 
 @app.route("/webhooks/hubspot", methods=["POST"])
+@verify_hubspot_signature
 def hubspot_webhook():
-    """Handle HubSpot webhook events."""
+    """Handle HubSpot webhook events.
+    
+    Syncable events are stored in SYNC_QUEUE, handed to SYNC_POOL and
+    acknowledged right away; each sync logs its own outcome. A failed store
+    returns 500 so HubSpot redelivers.
+    """
     
     try:
-        events = request.json
-        logger.info(f"Webhook received with {len(events) if isinstance(events, list) else 1} event(s)")
+        # Parse the raw body once; signature verification already read it
+        raw = request.get_data(cache=True)
+        logger.debug("Webhook body: %r", raw[:200])
+        events = orjson.loads(raw) if raw else []
+        logger.info("Webhook received with %s event(s)", len(events) if isinstance(events, list) else 1)
         
         if not isinstance(events, list):
             events = [events]
         
-        results = []
+        # One sync per contact; a creation event takes precedence
+        pending = {}
         
         for event in events:
             subscription_type = event.get("subscriptionType", "")
             object_id = str(event.get("objectId", ""))
             
-            logger.info(f"Processing: {subscription_type} for contact {object_id}")
+            logger.info("Processing: %s for contact %s", subscription_type, object_id)
             
-            if subscription_type in ["contact.creation", "contact.propertyChange"]:
-                result = sync_contact_to_partner(object_id, subscription_type)
-                results.append(result)
+            if (subscription_type == "contact.propertyChange"
+                    and event.get("propertyName") not in Config.ALL_PROPERTIES_SET):
+                logger.debug("Ignoring change to unsynced property: %s", event.get("propertyName"))
+            elif subscription_type in _SYNCED_EVENTS:
+                if pending.get(object_id) != "contact.creation":
+                    pending[object_id] = subscription_type
             else:
-                logger.debug(f"Ignoring event type: {subscription_type}")
+                logger.debug("Ignoring event type: %s", subscription_type)
+        
+        # Skip contacts that an earlier delivery already has queued, and
+        # persist the rest before acknowledging
+        with _QUEUED_IDS_LOCK:
+            pending = {k: v for k, v in pending.items() if k not in _QUEUED_IDS}
+            rows = SYNC_QUEUE.add(pending.items())
+            _QUEUED_IDS.update(pending)
+        
+        submit_queued(rows)
+        
+        with _SYNC_STATS_LOCK:
+            SYNC_STATS["queued"] += len(rows)
         
-        return jsonify({
-            "received": len(events),
-            "processed": len(results),
-            "results": results
-        })
+        logger.info("Queued %s of %s event(s) for sync", len(rows), len(events))
+        return jsonify({"received": len(events), "queued": len(rows)}), 202
         
     except Exception as e:
-        logger.error(f"Webhook processing error: {e}")
+        logger.error("Webhook processing error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -314,7 +973,8 @@ def test_sync(contact_id):
     if not Config.SOURCE_TOKEN or not Config.DEST_TOKEN:
         return jsonify({"error": "Tokens not configured"}), 500
     
-    result = sync_contact_to_partner(contact_id, "manual_test")
+    # Manual pushes bypass the unchanged-since-last-sync skip
+    result = sync_contact_to_partner(contact_id, "manual_test", force=True)
     return jsonify(result)
 
 
@@ -323,12 +983,10 @@ def test_connection():
     """Test connections to both HubSpot portals."""
     results = {}
     
-    source = HubSpotAPI(Config.SOURCE_TOKEN)
-    success, response = source._request("GET", "/crm/v3/objects/contacts?limit=1")
+    success, response = SOURCE_API._request("GET", "/crm/v3/objects/contacts?limit=1")
     results["source"] = {"status": "connected"} if success else {"status": "error", "message": response}
     
-    dest = HubSpotAPI(Config.DEST_TOKEN)
-    success, response = dest._request("GET", "/crm/v3/objects/contacts?limit=1")
+    success, response = DEST_API._request("GET", "/crm/v3/objects/contacts?limit=1")
     results["destination"] = {"status": "connected"} if success else {"status": "error", "message": response}
     
     return jsonify(results)
@@ -344,5 +1002,9 @@ if __name__ == "__main__":
     if not Config.DEST_TOKEN:
         logger.warning("HUBSPOT_DEST_TOKEN not set")
     
-    logger.info(f"Starting server on port {Config.PORT}")
-    app.run(host="0.0.0.0", port=Config.PORT)
+    if os.environ.get("USE_DEV_SERVER"):
+        logger.info("Starting dev server on port %s", Config.PORT)
+        app.run(host="0.0.0.0", port=Config.PORT)
+    else:
+        logger.info("Starting gunicorn (gevent) on port %s", Config.PORT)
+        os.execvp("gunicorn", ["gunicorn", "-c", "gunicorn_conf.py", "webhook_server:app"])
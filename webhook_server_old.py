@@ -17,16 +17,24 @@ Environment Variables Required:
 """
 
 import os
-import json
+import base64
 import hmac
 import hashlib
 import logging
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from functools import wraps
 
+import orjson
 import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 
 # =============================================================================
 # CONFIGURATION
@@ -39,6 +47,10 @@ class Config:
     SOURCE_TOKEN = os.environ.get("HUBSPOT_SOURCE_TOKEN", "")
     DEST_TOKEN = os.environ.get("HUBSPOT_DEST_TOKEN", "")
     CLIENT_SECRET = os.environ.get("HUBSPOT_CLIENT_SECRET", "")
+    # Legacy v1 signatures are deprecated by HubSpot; only accepted if enabled
+    ACCEPT_V1_SIGNATURE = os.environ.get("ACCEPT_V1_SIGNATURE", "false").lower() == "true"
+    # Reject webhooks older than this (HubSpot recommends 5 minutes)
+    MAX_WEBHOOK_AGE_MS = 5 * 60 * 1000
     
     # Server settings
     PORT = int(os.environ.get("PORT", 8080))
@@ -50,6 +62,9 @@ class Config:
         "jobtitle", "address", "city", "state", "zip", "country",
         "website", "lifecyclestage", "hs_lead_status"
     ]
+    # Built once: a set for O(1) membership checks, and the CSV for reads
+    PROPERTIES_TO_SYNC_SET = frozenset(PROPERTIES_TO_SYNC)
+    PROPERTIES_TO_SYNC_CSV = ",".join(PROPERTIES_TO_SYNC)
     
     # Optional: Only sync contacts from specific forms (leave empty for all)
     # Add form GUIDs here to filter, e.g., ["abc123-def456", "xyz789"]
@@ -72,59 +87,101 @@ logger = logging.getLogger(__name__)
 # FLASK APP
 # =============================================================================
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify."""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round-trip of the default provider
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 
 # =============================================================================
 # HUBSPOT API CLIENT
 # =============================================================================
 
+# Pooled sessions keyed by access token, so keep-alive connections to
+# api.hubapi.com are reused across webhook calls instead of re-doing TLS
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# Rate limits and transient errors are retried by urllib3 with jittered
+# exponential backoff, honouring Retry-After on 429s. The final response is
+# returned rather than raised so callers see the real status code.
+_RETRY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    backoff_jitter=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST", "PATCH"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+
+def _make_session(access_token: str) -> requests.Session:
+    """Build a keep-alive session with auth headers for one token."""
+    session = requests.Session()
+    session.headers.update({
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    })
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=_RETRY))
+    return session
+
+
+def _get_session(access_token: str) -> requests.Session:
+    """Return the shared session for a token, creating it on first use."""
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(access_token)
+        if session is None:
+            session = _SESSIONS[access_token] = _make_session(access_token)
+        return session
+
+
 class HubSpotAPI:
     """Simple HubSpot API client."""
     
     BASE_URL = "https://api.hubapi.com"
+    # Default get_contact path, with the properties query baked in at import
+    CONTACT_PATH_TMPL = "/crm/v3/objects/contacts/{id}?properties=" + Config.PROPERTIES_TO_SYNC_CSV
     
     def __init__(self, access_token: str):
         self.token = access_token
-        self.headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
     
-    def _request(self, method: str, endpoint: str, data: dict = None, retries: int = 3) -> dict:
-        """Make API request with retry logic."""
+    @property
+    def session(self) -> requests.Session:
+        """Pooled session for this token, built on first use (after any fork)."""
+        return _get_session(self.token)
+    
+    def _request(self, method: str, endpoint: str, data: dict = None) -> dict:
+        """Make API request. Retries are handled by the session's adapter."""
         url = f"{self.BASE_URL}{endpoint}"
         
-        for attempt in range(retries):
-            try:
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    headers=self.headers,
-                    json=data,
-                    timeout=30
-                )
-                
-                # Handle rate limiting
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", 10))
-                    logger.warning(f"Rate limited, waiting {retry_after}s...")
-                    time.sleep(retry_after)
-                    continue
-                
-                response.raise_for_status()
-                return response.json() if response.text else {}
-                
-            except requests.exceptions.RequestException as e:
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                raise
+        response = self.session.request(
+            method=method,
+            url=url,
+            data=orjson.dumps(data) if data is not None else None,
+            timeout=30
+        )
         
-        return {}
+        response.raise_for_status()
+        return orjson.loads(response.content) if response.content else {}
     
-    def get_contact(self, contact_id: str, properties: list) -> dict:
-        """Get contact by ID."""
+    def get_contact(self, contact_id: str, properties: list = None) -> dict:
+        """Get contact by ID, reading Config.PROPERTIES_TO_SYNC unless given a list."""
+        if not properties:
+            return self._request("GET", self.CONTACT_PATH_TMPL.format(id=contact_id))
         props = ",".join(properties)
         return self._request("GET", f"/crm/v3/objects/contacts/{contact_id}?properties={props}")
     
@@ -152,10 +209,23 @@ class HubSpotAPI:
         return self._request("PATCH", f"/crm/v3/objects/contacts/{contact_id}", {"properties": properties})
 
 
+SOURCE_API = HubSpotAPI(Config.SOURCE_TOKEN)
+DEST_API = HubSpotAPI(Config.DEST_TOKEN)
+
+
 # =============================================================================
 # WEBHOOK VERIFICATION
 # =============================================================================
 
+# Encoded once rather than on every webhook
+_CLIENT_SECRET_BYTES = Config.CLIENT_SECRET.encode()
+
+# Recently accepted v3 signatures, to reject exact replays inside the
+# freshness window
+_RECENT_SIGNATURES = deque(maxlen=1000)
+_RECENT_SIGNATURES_LOCK = threading.Lock()
+
+
 def verify_hubspot_signature(f):
     """Decorator to verify HubSpot webhook signatures."""
     @wraps(f)
@@ -169,34 +239,53 @@ def verify_hubspot_signature(f):
         signature = request.headers.get("X-HubSpot-Signature-v3")
         timestamp = request.headers.get("X-HubSpot-Request-Timestamp")
         
+        # Raw body bytes; cached so the handler's request.json reuses them
+        body = request.get_data(cache=True)
+        
         if not signature or not timestamp:
-            # Try v1 signature as fallback
+            # Try v1 signature as fallback, if enabled
             signature_v1 = request.headers.get("X-HubSpot-Signature")
-            if signature_v1:
+            if signature_v1 and Config.ACCEPT_V1_SIGNATURE:
                 # V1 verification
-                source_string = Config.CLIENT_SECRET + request.get_data(as_text=True)
-                expected = hashlib.sha256(source_string.encode()).hexdigest()
+                expected = hashlib.sha256(_CLIENT_SECRET_BYTES + body).hexdigest()
                 if hmac.compare_digest(expected, signature_v1):
                     return f(*args, **kwargs)
             
             logger.warning("Missing webhook signature headers")
             return jsonify({"error": "Missing signature"}), 401
         
-        # V3 verification
-        uri = request.url
-        body = request.get_data(as_text=True)
-        source_string = f"{request.method}{uri}{body}{timestamp}"
+        # Reject stale or replayed requests before hashing the body
+        try:
+            age_ms = abs(time.time() * 1000 - int(timestamp))
+        except ValueError:
+            age_ms = None
+        if age_ms is None or age_ms > Config.MAX_WEBHOOK_AGE_MS:
+            logger.warning("Stale webhook timestamp")
+            return jsonify({"error": "Stale request"}), 401
         
-        expected_signature = hmac.new(
-            Config.CLIENT_SECRET.encode(),
-            source_string.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        with _RECENT_SIGNATURES_LOCK:
+            replayed = signature in _RECENT_SIGNATURES
+        if replayed:
+            logger.warning("Replayed webhook signature")
+            return jsonify({"error": "Replayed request"}), 401
         
-        if not hmac.compare_digest(expected_signature, signature):
+        # V3 verification: base64 HMAC-SHA256 of method + uri + body + timestamp
+        # Feed the parts piecewise so the body is not copied; the named digest
+        # takes the OpenSSL-backed HMAC path
+        mac = hmac.new(_CLIENT_SECRET_BYTES, None, "sha256")
+        mac.update(request.method.encode())
+        mac.update(request.url.encode())
+        mac.update(body)
+        mac.update(timestamp.encode())
+        expected_signature = base64.b64encode(mac.digest())
+        
+        if not hmac.compare_digest(expected_signature, signature.encode()):
             logger.warning("Invalid webhook signature")
             return jsonify({"error": "Invalid signature"}), 401
         
+        with _RECENT_SIGNATURES_LOCK:
+            _RECENT_SIGNATURES.append(signature)
+        
         return f(*args, **kwargs)
     
     return decorated
@@ -206,6 +295,22 @@ def verify_hubspot_signature(f):
 # SYNC LOGIC
 # =============================================================================
 
+# Webhook subscription types that trigger a contact sync
+_SYNCED_EVENTS = frozenset({
+    "contact.creation",
+    "contact.propertyChange",
+    "form.submitted"  # If using form submission webhooks
+})
+
+# Shared across requests; per-event syncs are independent network I/O
+EXECUTOR = ThreadPoolExecutor(max_workers=32)
+
+# Destination contact IDs by lowercased email, so repeat events for the
+# same contact skip the rate-limited search
+_EMAIL_CACHE = TTLCache(maxsize=10000, ttl=300)
+_EMAIL_CACHE_LOCK = threading.Lock()
+
+
 def sync_contact_to_partner(contact_id: str, event_type: str = "unknown") -> dict:
     """Sync a single contact to the partner portal."""
     
@@ -218,8 +323,7 @@ def sync_contact_to_partner(contact_id: str, event_type: str = "unknown") -> dic
     
     try:
         # Get contact from source portal
-        source = HubSpotAPI(Config.SOURCE_TOKEN)
-        contact = source.get_contact(contact_id, Config.PROPERTIES_TO_SYNC)
+        contact = SOURCE_API.get_contact(contact_id)
         
         if not contact:
             result["status"] = "error"
@@ -237,21 +341,44 @@ def sync_contact_to_partner(contact_id: str, event_type: str = "unknown") -> dic
         # Filter to only properties with values
         sync_props = {
             k: v for k, v in props.items() 
-            if k in Config.PROPERTIES_TO_SYNC and v
+            if k in Config.PROPERTIES_TO_SYNC_SET and v
         }
         
-        # Sync to destination portal
-        dest = HubSpotAPI(Config.DEST_TOKEN)
-        existing = dest.search_by_email(email)
+        # Sync to destination portal, using the cached ID when we have one
+        email_key = email.lower()
+        with _EMAIL_CACHE_LOCK:
+            dest_id = _EMAIL_CACHE.get(email_key)
         
-        if existing:
-            dest.update_contact(existing["id"], sync_props)
-            result["status"] = "updated"
-            result["message"] = f"Updated contact: {email}"
-        else:
-            dest.create_contact(sync_props)
-            result["status"] = "created"
-            result["message"] = f"Created contact: {email}"
+        if dest_id:
+            try:
+                DEST_API.update_contact(dest_id, sync_props)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                # Deleted or merged in the destination; look it up again
+                with _EMAIL_CACHE_LOCK:
+                    _EMAIL_CACHE.pop(email_key, None)
+                dest_id = None
+            else:
+                result["status"] = "updated"
+                result["message"] = f"Updated contact: {email}"
+        
+        if not dest_id:
+            existing = DEST_API.search_by_email(email)
+            
+            if existing:
+                dest_id = existing["id"]
+                DEST_API.update_contact(dest_id, sync_props)
+                result["status"] = "updated"
+                result["message"] = f"Updated contact: {email}"
+            else:
+                dest_id = DEST_API.create_contact(sync_props).get("id")
+                result["status"] = "created"
+                result["message"] = f"Created contact: {email}"
+            
+            if dest_id:
+                with _EMAIL_CACHE_LOCK:
+                    _EMAIL_CACHE[email_key] = dest_id
         
         logger.info(f"[{event_type}] {result['message']}")
         
@@ -314,6 +441,9 @@ def hubspot_webhook():
             events = [events]
         
         results = []
+        # One sync per contact, so events for the same contact in one
+        # delivery don't race each other; a creation event takes precedence
+        pending = {}
         
         for event in events:
             subscription_type = event.get("subscriptionType", "")
@@ -322,11 +452,7 @@ def hubspot_webhook():
             logger.info(f"Received webhook: {subscription_type} for contact {object_id}")
             
             # Handle different event types
-            if subscription_type in [
-                "contact.creation",
-                "contact.propertyChange",
-                "form.submitted"  # If using form submission webhooks
-            ]:
+            if subscription_type in _SYNCED_EVENTS:
                 # Check form filter if this is a form submission
                 if subscription_type == "form.submitted":
                     form_id = event.get("formId", "")
@@ -339,12 +465,17 @@ def hubspot_webhook():
                         })
                         continue
                 
-                # Sync the contact
-                result = sync_contact_to_partner(object_id, subscription_type)
-                results.append(result)
+                if pending.get(object_id) != "contact.creation":
+                    pending[object_id] = subscription_type
             else:
                 logger.debug(f"Ignoring event type: {subscription_type}")
         
+        # Sync distinct contacts concurrently with the rest of the batch
+        for object_id, subscription_type in pending.items():
+            results.append(EXECUTOR.submit(sync_contact_to_partner, object_id, subscription_type))
+        
+        results = [r.result() if isinstance(r, Future) else r for r in results]
+        
         return jsonify({
             "received": len(events),
             "processed": len(results),
@@ -377,16 +508,14 @@ def test_connection():
     
     # Test source
     try:
-        source = HubSpotAPI(Config.SOURCE_TOKEN)
-        source._request("GET", "/crm/v3/objects/contacts?limit=1")
+        SOURCE_API._request("GET", "/crm/v3/objects/contacts?limit=1")
         results["source"] = {"status": "connected"}
     except Exception as e:
         results["source"] = {"status": "error", "message": str(e)}
     
     # Test destination
     try:
-        dest = HubSpotAPI(Config.DEST_TOKEN)
-        dest._request("GET", "/crm/v3/objects/contacts?limit=1")
+        DEST_API._request("GET", "/crm/v3/objects/contacts?limit=1")
         results["destination"] = {"status": "connected"}
     except Exception as e:
         results["destination"] = {"status": "error", "message": str(e)}